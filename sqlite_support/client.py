@@ -1,48 +1,242 @@
 import sqlite3
 import logging
+import threading
+import queue
 from contextlib import contextmanager
 
+from kinto.core.storage import exceptions
+
 logger = logging.getLogger(__name__)
 
+# PRAGMAs applied once to every new connection.
+# Values can be overriden per client, see SQLiteClient.
+DEFAULT_PRAGMAS = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'cache_size': -16000,
+    'mmap_size': 0,
+    'busy_timeout': 5000,
+}
+
+
 class SQLiteClient:
-    """Client class for SQLite."""
+    """Client class for SQLite.
+
+    Connections are pooled and reused. A file backed database gets
+    a pool of reader connections and one writer connection. Readers
+    are never blocked by the writer thanks to the WAL journal mode,
+    and writes are serialized inside the process by a lock so that
+    threads never fight over SQLite's write lock.
+    """
 
     # Creates a client object with given args.
     # db_path:- path to db file. Can be :memory:
     #   for in-memory dbs.
     # isolation_level:- specifies when transactions
     #   become visible to other connections.
+    # pool_size:- maximum number of reader connections.
+    # pool_timeout:- seconds to wait for a free reader
+    #   connection when the pool is exhausted.
+    # pragmas:- dict of PRAGMAs overriding DEFAULT_PRAGMAS.
 
     # See sqlite3 for python docs for more details.
     # https://docs.python.org/3/library/sqlite3.html
-    def __init__(self, db_path, isolation_level = None):
+    def __init__(self, db_path, isolation_level=None, pool_size=10,
+                 pool_timeout=30, pragmas=None):
         self._db_path = db_path
         self._isolation_level = isolation_level
+        self._pool_size = pool_size
+        self._pool_timeout = pool_timeout
+        self._pragmas = {**DEFAULT_PRAGMAS, **(pragmas or {})}
+
+        # Connections checked out by the current thread.
+        self._local = threading.local()
+        # Serializes writes inside this process.
+        self._write_lock = threading.RLock()
+        # Every connection ever opened, to be able to close them.
+        self._connections = []
+        self._connections_lock = threading.Lock()
+
+        if self._db_path == ":memory:":
+            # In-memory databases only live in their connection,
+            # so readers and writer have to share it.
+            self._writer = self._open()
+            self._readers = None
+        else:
+            self._writer = None
+            self._readers = queue.LifoQueue()
+            self._readers_semaphore = threading.BoundedSemaphore(pool_size)
+
+    # Opens a new connection and sets the PRAGMAs on it.
+    # readonly:- if True, connection is not allowed
+    #   to write to the database.
+    def _open(self, readonly=False):
+        logger.debug("Creating connection to SQLite DB on path: " + str(self._db_path))
+        connection = sqlite3.connect(self._db_path,
+                                     isolation_level=self._isolation_level,
+                                     check_same_thread=False,
+                                     timeout=self._pragmas['busy_timeout'] / 1000.0)
+        connection.row_factory = sqlite3.Row
+
+        pragmas = dict(self._pragmas)
         if self._db_path == ":memory:":
-            self._connection = sqlite3.connect(self._db_path, isolation_level=self._isolation_level)
-            self._connection.row_factory = sqlite3.Row
+            # WAL is not supported for in-memory databases.
+            pragmas.pop('journal_mode')
+        for name, value in pragmas.items():
+            connection.execute("PRAGMA {} = {};".format(name, value))
+        if readonly:
+            connection.execute("PRAGMA query_only = ON;")
+
+        with self._connections_lock:
+            self._connections.append(connection)
+        return connection
+
+    def _acquire_reader(self):
+        if not self._readers_semaphore.acquire(timeout=self._pool_timeout):
+            raise exceptions.BackendError(
+                message="Timed out waiting for a SQLite reader connection.")
+        try:
+            return self._readers.get_nowait()
+        except queue.Empty:
+            try:
+                return self._open(readonly=True)
+            except Exception:
+                self._readers_semaphore.release()
+                raise
+
+    def _release_reader(self, connection):
+        self._readers.put(connection)
+        self._readers_semaphore.release()
+
+    def _get_writer(self):
+        if self._writer is None:
+            self._writer = self._open()
+        return self._writer
 
     # Returns a cursor object to execute sql
     # statements by connecting to the db.
+    # readonly:- if True, a pooled reader connection is used.
+    #   Otherwise, the writer connection is used inside a
+    #   transaction that is committed if no error occurs, and
+    #   rolled back otherwise.
+    # force_commit:- kept for parity with Kinto's PostgreSQL
+    #   client. Writes are always committed on success.
     # return type:- sqlite.cursor
-
     @contextmanager
-    def connect(self,commit = False, force_commit = False):
-        logger.info("Creating connection to SQLite DB on path: " + str(self._db_path))
-        try:
-            if self._db_path == ":memory:":
-                cursor =  self._connection.cursor()
+    def connect(self, readonly=False, force_commit=False):
+        local = self._local
+        writing = getattr(local, 'writing', False)
+        reading = getattr(local, 'reader', None) is not None
+
+        # Nested contexts reuse whatever the thread already holds,
+        # so that reads inside a write transaction see its changes.
+        if writing or (readonly and reading):
+            connection = self._writer if writing else local.reader
+            cursor = connection.cursor()
+            try:
                 yield cursor
-                if commit:
-                    self._connection.commit()
-            else:
-                connection = sqlite3.connect(self._db_path, isolation_level=self._isolation_level)
-                connection.row_factory = sqlite3.Row
+            finally:
+                cursor.close()
+            return
+
+        if readonly and self._readers is not None:
+            yield from self._read(local)
+        else:
+            yield from self._write(local)
+
+    def _read(self, local):
+        connection = self._acquire_reader()
+        local.reader = connection
+        cursor = connection.cursor()
+        try:
+            yield cursor
+        except sqlite3.Error as e:
+            logger.error(e, exc_info=True)
+            raise exceptions.BackendError(original=e) from e
+        finally:
+            cursor.close()
+            local.reader = None
+            self._release_reader(connection)
+
+    def _write(self, local):
+        with self._write_lock:
+            connection = None
+            cursor = None
+            try:
+                connection = self._get_writer()
+                local.writing = True
+                connection.execute("BEGIN IMMEDIATE;")
                 cursor = connection.cursor()
                 yield cursor
-                if commit:
-                    self._connection.commit()
-                cursor.close()
-        except Exception as e:
-            logger.error(msg=str(e))
-            raise e
\ No newline at end of file
+                # executescript() commits by itself.
+                if connection.in_transaction:
+                    connection.commit()
+            except sqlite3.IntegrityError as e:
+                logger.error(e, exc_info=True)
+                self._rollback(connection)
+                raise exceptions.IntegrityError(original=e) from e
+            except sqlite3.Error as e:
+                logger.error(e, exc_info=True)
+                self._rollback(connection)
+                raise exceptions.BackendError(original=e) from e
+            except BaseException:
+                self._rollback(connection)
+                raise
+            finally:
+                if cursor is not None:
+                    cursor.close()
+                local.writing = False
+
+    def _rollback(self, connection):
+        if connection is not None and connection.in_transaction:
+            connection.rollback()
+
+    # Closes every connection opened by this client.
+    def close(self):
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+        for connection in connections:
+            connection.close()
+        self._writer = None
+        if self._readers is not None:
+            self._readers = queue.LifoQueue()
+            self._readers_semaphore = threading.BoundedSemaphore(self._pool_size)
+
+
+# Reuse existing client if same database file.
+_CLIENTS = {}
+_CLIENTS_LOCK = threading.Lock()
+
+
+def create_from_config(config, prefix='storage_'):
+    """Create a SQLiteClient using settings in the provided config.
+
+    Clients of file backed databases are shared between the backends
+    using the same file, so that they share the same writer.
+    """
+    settings = config.get_settings()
+    db_path = settings[prefix + 'location']
+
+    pragmas = {}
+    for name in DEFAULT_PRAGMAS:
+        value = settings.get(prefix + name)
+        if value is not None:
+            pragmas[name] = value
+
+    kwargs = dict(pragmas=pragmas)
+    if settings.get(prefix + 'pool_size') is not None:
+        kwargs['pool_size'] = int(settings[prefix + 'pool_size'])
+    if settings.get(prefix + 'pool_timeout') is not None:
+        kwargs['pool_timeout'] = float(settings[prefix + 'pool_timeout'])
+
+    if db_path == ":memory:":
+        return SQLiteClient(db_path, **kwargs)
+
+    with _CLIENTS_LOCK:
+        existing = _CLIENTS.get(db_path)
+        if existing is None:
+            existing = _CLIENTS[db_path] = SQLiteClient(db_path, **kwargs)
+        else:
+            logger.warning('Reuse existing SQLite client. '
+                           'Parameters {}* will be ignored.'.format(prefix))
+        return existing
@@ -0,0 +1,171 @@
+# This file contains the SQL expressions used to read
+# fields of the JSON data column, and the index manager
+# that creates expression indexes on them.
+# Queries and indexes must use exactly the same expressions,
+# otherwise SQLite can not use the indexes.
+
+import hashlib
+import logging
+import threading
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+INDEX_PREFIX = 'idx_records_json_'
+
+# JSON types as returned by json_type(), ranked like PostgreSQL
+# orders JSONB values: null < string < number < boolean < array < object.
+JSON_TYPES_RANKS = (
+    ('null', 0),
+    ('text', 1),
+    ('integer', 2),
+    ('real', 2),
+    ('true', 3),
+    ('false', 3),
+    ('array', 4),
+    ('object', 5),
+)
+
+
+# Returns the JSON path of a field as a SQL string literal.
+# Subfields are separated with dots, ``person.name``
+# becomes ``'$."person"."name"'``.
+def json_path(field):
+    path = '$' + ''.join('."{}"'.format(subfield) for subfield in field.split('.'))
+    return "'{}'".format(path.replace("'", "''"))
+
+
+# Returns the SQL expression of the value of a field.
+# Strings and numbers are returned as SQL values, booleans
+# as 0 and 1, and arrays and objects as JSON text.
+def json_value_sql(field, column='data'):
+    return 'json_extract({}, {})'.format(column, json_path(field))
+
+
+# Returns the SQL expression of the rank of the JSON type
+# of a field, NULL if the field is missing.
+def json_rank_sql(field=None, column='data', type_sql=None):
+    if type_sql is None:
+        type_sql = 'json_type({}, {})'.format(column, json_path(field))
+    whens = ' '.join("WHEN '{}' THEN {}".format(t, rank) for t, rank in JSON_TYPES_RANKS)
+    return 'CASE {} {} END'.format(type_sql, whens)
+
+
+# Returns the rank of the JSON type of a python value.
+def json_rank(value):
+    if value is None:
+        return 0
+    if isinstance(value, str):
+        return 1
+    if isinstance(value, bool):
+        return 3
+    if isinstance(value, (int, float)):
+        return 2
+    if isinstance(value, (list, tuple)):
+        return 4
+    return 5
+
+
+class IndexManager:
+    """Creates and drops expression indexes on JSON fields.
+
+    Indexes are partial indexes on the records of one collection,
+    i.e. one ``(parent_id, collection_id)`` pair, over the rank and
+    value expressions used by the storage filters.
+
+    Indexes can be listed in configuration, or created automatically
+    once a field has been filtered on ``auto_index_threshold`` times.
+    """
+
+    # client:- SQLite client to use
+    # fields:- list of (parent_id, collection_id, field) to index.
+    # auto_index_threshold:- number of filtered queries on a field
+    #   after which it gets indexed. None disables it.
+    def __init__(self, client, fields=None, auto_index_threshold=None):
+        self.client = client
+        self.fields = list(fields or [])
+        self.auto_index_threshold = auto_index_threshold
+        self._observed = Counter()
+        self._existing = None
+        self._lock = threading.Lock()
+
+    # Returns the name of the index of a field.
+    def index_name(self, parent_id, collection_id, field):
+        key = '\x00'.join((parent_id, collection_id, field)).encode('utf-8')
+        return INDEX_PREFIX + hashlib.sha1(key).hexdigest()[:16]
+
+    def _existing_indexes(self, conn):
+        if self._existing is None:
+            query = "SELECT name FROM sqlite_master WHERE type = 'index' AND name LIKE :prefix;"
+            results = conn.execute(query, {'prefix': INDEX_PREFIX + '%'})
+            self._existing = {row['name'] for row in results.fetchall()}
+        return self._existing
+
+    # Returns the names of the JSON indexes in database.
+    def list_indexes(self):
+        with self.client.connect(readonly=True) as conn:
+            with self._lock:
+                self._existing = None
+                return sorted(self._existing_indexes(conn))
+
+    def create_index(self, parent_id, collection_id, field):
+        name = self.index_name(parent_id, collection_id, field)
+        query = ("CREATE INDEX IF NOT EXISTS {name} ON records ({rank}, {value}) "
+                 "WHERE parent_id = {parent_id} AND collection_id = {collection_id};")
+        query = query.format(name=name,
+                             rank=json_rank_sql(field),
+                             value=json_value_sql(field),
+                             parent_id=_quote(parent_id),
+                             collection_id=_quote(collection_id))
+        logger.info('Create index {} on field {} of {} {}'.format(
+            name, field, collection_id, parent_id))
+        with self.client.connect() as conn:
+            conn.execute(query)
+            with self._lock:
+                self._existing_indexes(conn).add(name)
+        return name
+
+    def drop_index(self, parent_id, collection_id, field):
+        name = self.index_name(parent_id, collection_id, field)
+        logger.info('Drop index {} on field {} of {} {}'.format(
+            name, field, collection_id, parent_id))
+        with self.client.connect() as conn:
+            conn.execute("DROP INDEX IF EXISTS {};".format(name))
+            with self._lock:
+                self._existing_indexes(conn).discard(name)
+        return name
+
+    # Creates the indexes listed in configuration.
+    def create_configured_indexes(self):
+        for parent_id, collection_id, field in self.fields:
+            self.create_index(parent_id, collection_id, field)
+
+    # Records that a query filtered on the given fields, and
+    # creates their index once they reach the threshold.
+    def observe(self, parent_id, collection_id, fields):
+        if self.auto_index_threshold is None:
+            return
+        to_create = []
+        with self._lock:
+            for field in fields:
+                key = (parent_id, collection_id, field)
+                self._observed[key] += 1
+                if self._observed[key] == self.auto_index_threshold:
+                    to_create.append(key)
+        for key in to_create:
+            self.create_index(*key)
+
+
+# Quotes a string as a SQL string literal.
+def _quote(value):
+    return "'{}'".format(value.replace("'", "''"))
+
+
+# Parses the list of fields to index from configuration.
+# Each entry is ``<parent_id>:<collection_id>:<field>``.
+def parse_indexed_fields(setting):
+    fields = []
+    for entry in (setting or '').split():
+        parent_id, collection_id, field = entry.rsplit(':', 2)
+        fields.append((parent_id, collection_id, field))
+    return fields
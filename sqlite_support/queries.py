@@ -6,11 +6,18 @@
 # Created by: Zeeshan Abid
 
 
+# This is an insert query. :NAME are placeholders
+# for values. Provide values as a dict
+# to the clients.execute method.
+INSERT_QUERY = "INSERT INTO {table_name} (id, parent_id, collection_id, data, last_modified, deleted) VALUES " \
+               "(:id, :parent_id, :collection_id, :data, :last_modified, :deleted)"
+
 # This is a create query. :NAME are placeholders
 # for values. Provide values as a dict
 # to the clients.execute method.
-CREATE_QUERY = "INSERT INTO {table_name} (id, parent_id, collection_id, data, last_modified, deleted) VALUES " \
-               "(:id, :parent_id, :collection_id, :data, :last_modified, :deleted) ;"
+# A tombstone with the same id is replaced by the new record.
+CREATE_QUERY = INSERT_QUERY + " ON CONFLICT(id, parent_id, collection_id) DO UPDATE SET data = :data, deleted = :deleted," \
+               " last_modified = :last_modified WHERE deleted;"
 
 # This is a read query. :NAME are placeholders
 # for values. Provide values as a dict
@@ -20,12 +27,23 @@ READ_QUERY = "SELECT * FROM {table_name} WHERE id=:id and parent_id = :parent_id
 # This is a delete query. :NAME are placeholders
 # for values. Provide values as a dict
 # to the clients.execute method.
-DELETE_QUERY = "DELERE FROM {table_name} WHERE id=:id and parent_id = :parent_id and collection_id = :collection_id;"
+DELETE_QUERY = "DELETE FROM {table_name} WHERE id=:id and parent_id = :parent_id and collection_id = :collection_id;"
+
+# This is a tombstone query. It marks a record
+# as deleted and replaces its data.
+TOMBSTONE_QUERY = "UPDATE {table_name} SET deleted = True, data = :data, last_modified = :last_modified" \
+                  " WHERE id=:id and parent_id = :parent_id and collection_id = :collection_id and deleted = False;"
+
+# This query fetches all the records of a list of ids.
+# :ids is a JSON array, so that the number of
+# placeholders does not depend on the number of ids.
+EXISTING_QUERY = "SELECT * FROM {table_name} WHERE parent_id = :parent_id and collection_id = :collection_id" \
+                 " and deleted = False and id IN (SELECT value FROM json_each(:ids));"
 
 # This is a update query. :NAME are placeholders
 # for values. Provide values as a dict
 # to the clients.execute method.
-UPDATE_QUERY = CREATE_QUERY[:-1] + "ON CONFLICT(id, parent_id, collection_id) do UPDATE SET data =:data, deleted=:deleted, last_modified = :last_modified" \
+UPDATE_QUERY = INSERT_QUERY + " ON CONFLICT(id, parent_id, collection_id) do UPDATE SET data =:data, deleted=:deleted, last_modified = :last_modified" \
                " WHERE id=:id and parent_id = :parent_id and collection_id = :collection_id;"
 
 # This is a get all query. :NAME are placeholders
@@ -34,22 +52,22 @@ UPDATE_QUERY = CREATE_QUERY[:-1] + "ON CONFLICT(id, parent_id, collection_id) do
 # Also, the {} args are for formatting the string
 # in python
 GET_ALL_QUERY = "WITH collection_filtered AS (" \
-                "SELECT id, last_modified, data, deleted" \
-                "FROM {table_name}"\
-                "WHERE {parent_id_filter}" \
-                "AND collection_id = :collection_id" \
-                "{conditions_deleted} " \
-                "{conditions_filter} " \
-                "{sorting}" \
+                " SELECT id, last_modified, data, deleted" \
+                " FROM {table_name}" \
+                " WHERE {parent_id_filter}" \
+                " AND collection_id = :collection_id" \
+                " {conditions_deleted}" \
+                " {conditions_filter}" \
+                " {sorting}" \
                 ")," \
-                "total_filtered AS (" \
-                "SELECT COUNT(id) AS count_total" \
-                "FROM collection_filtered" \
-                "WHERE deleted = false" \
+                " total_filtered AS (" \
+                " SELECT COUNT(id) AS count_total" \
+                " FROM collection_filtered" \
+                " WHERE NOT deleted" \
                 ")" \
-                "SELECT count_total," \
-                "a.id, a.last_modified AS last_modified, a.data" \
-                "FROM collection_filtered AS a," \
-                "total_filtered" \
-                "{pagination_rules}" \
-                "LIMIT :pagination_limit;"
\ No newline at end of file
+                " SELECT count_total," \
+                " a.id, a.last_modified AS last_modified, a.data" \
+                " FROM collection_filtered AS a," \
+                " total_filtered" \
+                " {pagination_rules}" \
+                " LIMIT :pagination_limit;"
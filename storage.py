@@ -7,17 +7,21 @@ import logging
 import os
 import json
 import time
-from collections import defaultdict
+from collections import Counter, defaultdict
 
 from kinto.core.storage import (StorageBase, DEFAULT_DELETED_FIELD,
                                 DEFAULT_ID_FIELD, DEFAULT_MODIFIED_FIELD,
-                                exceptions, generators)
+                                MISSING, exceptions, generators)
 from sqlite_support.queries import (CREATE_QUERY, READ_QUERY,
                                     DELETE_QUERY, UPDATE_QUERY,
-                                    GET_ALL_QUERY)
+                                    GET_ALL_QUERY, EXISTING_QUERY,
+                                    TOMBSTONE_QUERY)
 from sqlite_support.migrator import SQLiteMigratorMixin
 
-from sqlite_support.client import SQLiteClient
+from sqlite_support.client import create_from_config
+from sqlite_support.indexes import (IndexManager, json_path, json_rank,
+                                    json_rank_sql, json_value_sql,
+                                    parse_indexed_fields)
 from kinto.core.utils import COMPARISON
 
 
@@ -25,6 +29,13 @@ from kinto.core.utils import COMPARISON
 HERE = os.path.dirname(__file__)
 logger = logging.getLogger(__name__)
 
+# SQL operators of the comparisons that are not
+# written the same way in SQL and in Kinto.
+SQL_OPERATORS = {
+    COMPARISON.EQ: '=',
+    COMPARISON.NOT: '<>',
+}
+
 
 class Storage(StorageBase, SQLiteMigratorMixin):
     """Storage backend using SQLite.
@@ -60,60 +71,86 @@ class Storage(StorageBase, SQLiteMigratorMixin):
     # max_fetch_size:- Maximum number of records to fetch
     #   if query returns more than one results.
     # readonly:- Boolean indicating if records are mutable.
-    def __init__(self, client, max_fetch_size = 50, readonly=False, *args, **kwargs):
+    # index_manager:- IndexManager creating indexes on the
+    #   filtered fields of the data blob. Optional.
+    def __init__(self, client, max_fetch_size = 50, readonly=False,
+                 index_manager=None, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.client = client
         self._max_fetch_size = max_fetch_size
         self._readonly = readonly
+        self.index_manager = index_manager
 
     # returns the current version of the schema
     def get_installed_version(self):
         return self.schema_version
     # description:- Initializes the database schema
     def initialize_schema(self, dry_run=False):
-        return self.create_or_migrate_schema(dry_run)
+        result = self.create_or_migrate_schema(dry_run)
+        if self.index_manager is not None and not dry_run:
+            self.index_manager.create_configured_indexes()
+        return result
 
     def create(self, collection_id, parent_id, record, id_generator=None,
                id_field=DEFAULT_ID_FIELD,
                modified_field=DEFAULT_MODIFIED_FIELD,
                auth=None):
+        records = self.create_many(collection_id, parent_id, [record],
+                                   id_generator=id_generator,
+                                   id_field=id_field,
+                                   modified_field=modified_field,
+                                   auth=auth)
+        return records[0]
+
+    # description:- Creates several records in one transaction.
+    #   Raises UnicityError if any of the provided ids already
+    #   exists, in which case nothing is created.
+    # records:- list of records to create.
+    # return type:- list of created records, in the same order.
+    def create_many(self, collection_id, parent_id, records, id_generator=None,
+                    id_field=DEFAULT_ID_FIELD,
+                    modified_field=DEFAULT_MODIFIED_FIELD,
+                    auth=None):
         # Get the query and set table name
         query = CREATE_QUERY
         table_name = "records"
 
         # Check which id generator to use
         id_generator = id_generator or self.id_generator
-        record = {**record}
-
-        # If id_field in record check if it
-        # already is present in table
-        if id_field in record:
-            try:
-                existing = self.get(collection_id, parent_id, record[id_field])
-                raise exceptions.UnicityError(id_field, existing)
-            except exceptions.RecordNotFoundError:
-                pass
-        else:
-            # Generate ID
-            record[id_field] = id_generator()
+        records = [{**record} for record in records]
+
+        # Ids provided by the caller have to be checked
+        # for unicity. The others are generated.
+        provided_ids = []
+        for record in records:
+            if id_field in record:
+                provided_ids.append(record[id_field])
+            else:
+                record[id_field] = id_generator()
 
-        # Prepare values for SQL statement
-        values_dict = {
-            'id':record[id_field],
-            'parent_id':parent_id,
-            'collection_id':collection_id,
-            'data':json.dumps(record),
-            'last_modified':time.time(),
-            'deleted':False
-        }
+        values = [self._prepare_values(collection_id, parent_id, record,
+                                       id_field, modified_field)
+                  for record in records]
 
         # Execute
-        with self.client.connect(commit = True) as conn:
-            results = conn.execute(query.format(table_name = table_name), values_dict)
-            record = self.get(collection_id, parent_id, record[id_field])
+        with self.client.connect() as conn:
+            if provided_ids:
+                existing = self._get_existing(conn, collection_id, parent_id,
+                                              provided_ids, id_field, modified_field)
+                if existing:
+                    raise exceptions.UnicityError(id_field, existing[0])
 
-        return record
+                # Ids must also be unique within the batch.
+                counts = Counter(provided_ids)
+                for record in records:
+                    if counts[record[id_field]] > 1:
+                        raise exceptions.UnicityError(id_field, record)
 
+            conn.executemany(query.format(table_name=table_name), values)
+
+        for record, values_dict in zip(records, values):
+            record[modified_field] = values_dict['last_modified']
+        return records
 
     def get(self, collection_id, parent_id, object_id,
             id_field=DEFAULT_ID_FIELD,
@@ -133,111 +170,159 @@ class Storage(StorageBase, SQLiteMigratorMixin):
         object = None
 
         # Execute query
-        with self.client.connect() as conn:
+        with self.client.connect(readonly=True) as conn:
             results = conn.execute(query.format(table_name = table_name), values_dict)
             object = results.fetchone()
             # If object not found raise error
             if object == None:
                 raise exceptions.RecordNotFoundError(object_id)
 
-        # Convert blob to dict because it is
-        # stored as string
-        record = json.loads(object['data'])
-        record[id_field] = object['id']
-        record[modified_field] = object['last_modified']
-        return record
+        return self._row_to_record(object, id_field, modified_field)
 
     def update(self, collection_id, parent_id, object_id, record,
                id_field=DEFAULT_ID_FIELD,
                modified_field=DEFAULT_MODIFIED_FIELD,
                auth=None):
+        records = self.update_many(collection_id, parent_id,
+                                   [{**record, id_field: object_id}],
+                                   id_field=id_field,
+                                   modified_field=modified_field,
+                                   auth=auth)
+        return records[0]
+
+    # description:- Creates or replaces several records in one
+    #   transaction.
+    # records:- list of records to update. Each of them must
+    #   contain its id in id_field.
+    # return type:- list of updated records, in the same order.
+    def update_many(self, collection_id, parent_id, records,
+                    id_field=DEFAULT_ID_FIELD,
+                    modified_field=DEFAULT_MODIFIED_FIELD,
+                    auth=None):
         # Get update query and set table name
         query = UPDATE_QUERY
         table_name = 'records'
 
-        # Deleted is usually false until we get a record with
-        # deleted set to true
-        deleted = False or (record.get('deleted') != None)
-
-        # Delete id fields and deleted field as they are not stored with the
-        # data blob.
-        if 'deleted' in record:
-            del record['deleted']
-        if id_field in record:
-            del record[id_field]
-        if modified_field in record:
-            del record[modified_field]
-
-        # Prepare values
-        value_dict = {
-            'id':object_id,
-            'parent_id':parent_id,
-            'collection_id':collection_id,
-            'data':json.dumps(record),
-            'last_modified':time.time(),
-            'deleted':deleted
-        }
+        records = [{**record} for record in records]
+        values = []
+        for record in records:
+            # Deleted is usually false until we get a record with
+            # deleted set to true
+            deleted = record.pop('deleted', None) is not None
+            values.append(self._prepare_values(collection_id, parent_id, record,
+                                               id_field, modified_field,
+                                               deleted=deleted))
 
         # Execute
-        with self.client.connect(commit = True) as conn:
-            print(query.format(table_name = table_name))
-            result = conn.execute(query.format(table_name = table_name), value_dict)
-
-        # Try to get the update record
-        try:
-            record = self.get(collection_id, parent_id, object_id, id_field, modified_field)
-            print("updated record", record)
-            return record
-        except exceptions.RecordNotFoundError:
-            # if record not found
-            # raise error if this wasn't a delete update
-            if deleted:
-                pass
-            else:
-                raise exceptions.RecordNotFoundError
-
+        with self.client.connect() as conn:
+            conn.executemany(query.format(table_name=table_name), values)
 
+        for record, values_dict in zip(records, values):
+            record[modified_field] = values_dict['last_modified']
+        return records
 
     def delete(self, collection_id, parent_id, object_id,
                id_field=DEFAULT_ID_FIELD, with_deleted=True,
                modified_field=DEFAULT_MODIFIED_FIELD,
                deleted_field=DEFAULT_DELETED_FIELD,
                auth=None, last_modified=None):
-
+        records = self.delete_many(collection_id, parent_id, [object_id],
+                                   id_field=id_field,
+                                   with_deleted=with_deleted,
+                                   modified_field=modified_field,
+                                   deleted_field=deleted_field,
+                                   auth=auth,
+                                   last_modified=last_modified)
+        return records[0]
+
+    # description:- Deletes several records in one transaction.
+    #   Raises RecordNotFoundError if any of them does not
+    #   exist, in which case nothing is deleted.
+    # object_ids:- list of ids of the records to delete.
+    # with_deleted:- if True, records are replaced by tombstones.
+    #   Otherwise, they are actually deleted from database.
+    # return type:- list of deleted records, in the same order.
+    def delete_many(self, collection_id, parent_id, object_ids,
+                    id_field=DEFAULT_ID_FIELD, with_deleted=True,
+                    modified_field=DEFAULT_MODIFIED_FIELD,
+                    deleted_field=DEFAULT_DELETED_FIELD,
+                    auth=None, last_modified=None):
+        table_name = "records"
         if with_deleted:
             # Deleted by marking it as delete
-            record = self.get(collection_id, parent_id, object_id, id_field=id_field, modified_field=modified_field)
-            record[deleted_field] = True
-
-            # Use update to set delete. Does not
-            # return a record when used like this
-            self.update(collection_id, parent_id, object_id, record, id_field=id_field, modified_field= modified_field)
-
-            # Last modified would be right after setting delet
-            record[modified_field] = time.time()
-            return record
+            query = TOMBSTONE_QUERY
         else:
             # Actually delete from database
             query = DELETE_QUERY
-            table_name = "records"
 
-            values_dict = {
-                'id' : object_id,
+        deleted_data = json.dumps({deleted_field: True})
+        values = []
+        for object_id in object_ids:
+            values.append({
+                'id': object_id,
                 'parent_id': parent_id,
-                'collection_id':collection_id
-            }
+                'collection_id': collection_id,
+                'data': deleted_data,
+                'last_modified': last_modified or time.time(),
+            })
 
-            with self.client.connect() as conn:
-                results = conn.execute(query.format(table_name = table_name), values_dict)
-                if results <= 0:
-                    raise exceptions.RecordNotFoundError
+        with self.client.connect() as conn:
+            existing = self._get_existing(conn, collection_id, parent_id,
+                                          object_ids, id_field, modified_field)
+            existing_ids = {record[id_field] for record in existing}
+            for object_id in object_ids:
+                if object_id not in existing_ids:
+                    raise exceptions.RecordNotFoundError(object_id)
 
-                deleted = results.fetchone()
+            conn.executemany(query.format(table_name=table_name), values)
 
+        records = []
+        for values_dict in values:
             record = {}
-            record[modified_field] = deleted['last_modified']
+            record[id_field] = values_dict['id']
+            record[modified_field] = values_dict['last_modified']
             record[deleted_field] = True
-            return record
+            records.append(record)
+        return records
+
+    # Fetches the records of the given ids that are not
+    # deleted, using a single query for all of them.
+    def _get_existing(self, conn, collection_id, parent_id, object_ids,
+                      id_field, modified_field):
+        values_dict = {
+            'ids': json.dumps(object_ids),
+            'parent_id': parent_id,
+            'collection_id': collection_id
+        }
+        results = conn.execute(EXISTING_QUERY.format(table_name="records"), values_dict)
+        return [self._row_to_record(row, id_field, modified_field)
+                for row in results.fetchall()]
+
+    # Prepares the values for the create and update
+    # SQL statements. Id and last modified are not
+    # stored in the data blob as they have their own columns.
+    def _prepare_values(self, collection_id, parent_id, record,
+                        id_field, modified_field, deleted=False):
+        data = {**record}
+        data.pop(id_field, None)
+        data.pop(modified_field, None)
+        return {
+            'id': record[id_field],
+            'parent_id': parent_id,
+            'collection_id': collection_id,
+            'data': json.dumps(data),
+            'last_modified': time.time(),
+            'deleted': deleted
+        }
+
+    # Converts a row of the records table to a record.
+    def _row_to_record(self, row, id_field, modified_field):
+        # Convert blob to dict because it is
+        # stored as string
+        record = json.loads(row['data'])
+        record[id_field] = row['id']
+        record[modified_field] = row['last_modified']
+        return record
 
 
     def delete_all(self, collection_id, parent_id, filters=None,
@@ -268,6 +353,7 @@ class Storage(StorageBase, SQLiteMigratorMixin):
         }
 
         format_values = defaultdict(str)
+        format_values['table_name'] = table_name
 
         # Parent conditions
         if '*' in parent_id:
@@ -277,10 +363,15 @@ class Storage(StorageBase, SQLiteMigratorMixin):
             format_values['parent_id_filter'] = 'parent_id = :parent_id'
 
         if filters:
-            conditions, holders, data_filters = self._format_filtering_conditions(filters, id_field, modified_field)
+            safe_sql, holders = self._format_filtering_conditions(filters, id_field, modified_field)
+            format_values['conditions_filter'] = 'AND {}'.format(safe_sql)
+            values_dict.update(holders)
 
-            filters_condition = "AND {}".format(map(lambda x: x[0].format(x[1])), zip(conditions, holders))
-            values_dict['conditions_filter'] = filters_condition
+            # Let the index manager know which fields are filtered on.
+            if self.index_manager is not None and '*' not in parent_id:
+                data_fields = [f.field for f in filters
+                               if f.field not in (id_field, modified_field)]
+                self.index_manager.observe(parent_id, collection_id, data_fields)
 
         if sorting:
             pass
@@ -291,67 +382,189 @@ class Storage(StorageBase, SQLiteMigratorMixin):
         limit = min(self._max_fetch_size, limit) if limit else self._max_fetch_size
         values_dict["pagination_limit"] = limit
 
-
         # Deleted conditions
         if not include_deleted:
             format_values['conditions_deleted'] = 'AND NOT deleted'
 
-    def _format_filtering_conditions(self, filters, id_field, modified_field):
-
-        operators = {
-            COMPARISON.EQ: '=',
-            COMPARISON.NOT: '<>',
-            COMPARISON.IN: 'IN',
-            COMPARISON.EXCLUDE: 'NOT IN',
-            COMPARISON.LIKE: 'LIKE',
-            COMPARISON.CONTAINS: 'IN',
-        }
-
+        with self.client.connect(readonly=True) as conn:
+            results = conn.execute(query.format_map(format_values), values_dict)
+            retrieved = results.fetchmany(self._max_fetch_size)
+
+        if len(retrieved) == 0:
+            return [], 0
+
+        count_total = retrieved[0]['count_total']
+        records = [self._row_to_record(row, id_field, modified_field)
+                   for row in retrieved]
+        return records, count_total
+
+    # description:- Formats the filters list in SQL, with placeholders
+    #   for values. Fields of the data blob are read with JSON1
+    #   functions, using the same expressions as the indexes
+    #   created by the index manager.
+    # prefix:- prefix of the placeholders names.
+    # return type:- a SQL string with placeholders, and a dict
+    #   mapping placeholders to actual values.
+    def _format_filtering_conditions(self, filters, id_field, modified_field,
+                                     prefix='filters'):
         conditions = []
-        holders = []
-        data_filters = []
+        holders = {}
 
         for i, filter in enumerate(filters):
             value = filter.value
             field = filter.field
+            operator = filter.operator
+            value_holder = '{}_value_{}'.format(prefix, i)
+            rank_holder = '{}_rank_{}'.format(prefix, i)
 
+            # Columns are compared as is.
             if field in (id_field, modified_field):
+                sql_field = 'id' if field == id_field else 'last_modified'
                 if field == id_field:
-                    sql_field = "id"
-                    if type(value) == int:
+                    if isinstance(value, int):
                         value = str(value)
-
-                elif field == modified_field:
-                    sql_field = 'last_modified'
-                    if type(value) == int:
-                        value = str(value)
-
-                if filter.operator == COMPARISON.EQ or filter.operator == COMPARISON.NOT:
-                    condition_sql = "{} " + operators[filter.operator] + " {}"
-                    condition_values = (field, value)
-                elif filter.operator == COMPARISON.IN or filter.operator == COMPARISON.EXCLUDE:
-                    value = tuple(value)
-                    condition_sql = "{} " + operators[filter.operator] + " {}"
-                    condition_values = (field, value)
-                elif filter.operator == COMPARISON.LIKE:
-                    if '*' not in value:
-                        value = '*{}*'.format(value)
-                    value = value.replace('*', '%')
-                    condition_sql = "{} " + operators[COMPARISON.LIKE] + " {}"
-                    condition_values = (field, value)
-                elif filter.operator == COMPARISON.CONTAINS_ANY:
-                    condition_sql = "{} " + operators[COMPARISON.IN] + " {}"
-                    condition_values = (value, field)
-                elif filter.operator == COMPARISON.HAS:
-                    condition_sql = "{} IS {}"
-                    condition_values = (field, "NOT NULL") if value else (field, "NULL")
-
-                conditions.append(condition_sql)
-                holders.append(condition_values)
+                    elif operator in (COMPARISON.IN, COMPARISON.EXCLUDE):
+                        value = [str(v) if isinstance(v, int) else v for v in value]
+
+                if operator in (COMPARISON.IN, COMPARISON.EXCLUDE):
+                    sql_operator = 'IN' if operator == COMPARISON.IN else 'NOT IN'
+                    condition = '{} {} (SELECT value FROM json_each(:{}))'.format(
+                        sql_field, sql_operator, value_holder)
+                    value = json.dumps(list(value))
+                elif operator == COMPARISON.LIKE:
+                    condition = '{} LIKE :{}'.format(sql_field, value_holder)
+                    value = self._like_pattern(value)
+                elif operator == COMPARISON.HAS:
+                    condition = '{} IS {}'.format(sql_field, 'NOT NULL' if value else 'NULL')
+                else:
+                    sql_operator = SQL_OPERATORS.get(operator, operator.value)
+                    condition = '{} {} :{}'.format(sql_field, sql_operator, value_holder)
+
+                holders[value_holder] = value
+                conditions.append(condition)
+                continue
+
+            # Fields of the data blob are compared like JSONB
+            # values in PostgreSQL: by type rank, and then by value.
+            # Missing fields have a NULL rank.
+            rank_sql = json_rank_sql(field)
+            value_sql = json_value_sql(field)
+
+            if value is MISSING:
+                # Only used for pagination, see PostgreSQL backend.
+                if operator in (COMPARISON.EQ, COMPARISON.MIN):
+                    condition = '{} IS NULL'.format(rank_sql)
+                elif operator == COMPARISON.LT:
+                    condition = '{} IS NOT NULL'.format(rank_sql)
+                elif operator == COMPARISON.MAX:
+                    condition = '1'
+                elif operator == COMPARISON.GT:
+                    condition = '0'
+                else:
+                    raise ValueError('Somehow we got a filter with MISSING value')
+
+            elif operator == COMPARISON.HAS:
+                condition = '{} IS {}'.format(rank_sql, 'NOT NULL' if value else 'NULL')
+
+            elif operator in (COMPARISON.EQ, COMPARISON.NOT):
+                condition = self._format_json_equality(rank_sql, value_sql, value,
+                                                       value_holder, rank_holder, holders)
+                if operator == COMPARISON.NOT:
+                    condition = '({} IS NULL OR NOT ({}))'.format(rank_sql, condition)
+
+            elif operator in (COMPARISON.IN, COMPARISON.EXCLUDE):
+                # Values are grouped by type, so that each group
+                # can be matched on the index.
+                groups = defaultdict(list)
+                for v in value:
+                    groups[json_rank(v)].append(v)
+                alternatives = []
+                for rank, values in sorted(groups.items()):
+                    group_holder = '{}_{}'.format(value_holder, rank)
+                    if rank == 0:
+                        alternatives.append('{} = 0'.format(rank_sql))
+                        continue
+                    holders[group_holder] = json.dumps(values)
+                    alternatives.append(
+                        '({} = {} AND {} IN (SELECT value FROM json_each(:{})))'.format(
+                            rank_sql, rank, value_sql, group_holder))
+                condition = '({})'.format(' OR '.join(alternatives) or '0')
+                if operator == COMPARISON.EXCLUDE:
+                    condition = '({} IS NULL OR NOT {})'.format(rank_sql, condition)
+
+            elif operator == COMPARISON.LIKE:
+                # LIKE compares the text representation of the value.
+                holders[value_holder] = self._like_pattern(value)
+                condition = '({} IS NOT NULL AND {} LIKE :{})'.format(
+                    value_sql, value_sql, value_holder)
+
+            elif operator in (COMPARISON.CONTAINS, COMPARISON.CONTAINS_ANY):
+                holders[value_holder] = json.dumps(list(value))
+                needle_match = ('{} = {} AND haystack.value = needle.value'.format(
+                    json_rank_sql(type_sql='haystack.type'),
+                    json_rank_sql(type_sql='needle.type')))
+                haystack = 'json_each(data, {}) AS haystack'.format(json_path(field))
+                needles = 'json_each(:{}) AS needle'.format(value_holder)
+                if operator == COMPARISON.CONTAINS:
+                    # No value is missing from the array.
+                    match = ('NOT EXISTS (SELECT 1 FROM {needles} WHERE NOT EXISTS '
+                             '(SELECT 1 FROM {haystack} WHERE {needle_match}))')
+                else:
+                    # At least one value is in the array.
+                    match = 'EXISTS (SELECT 1 FROM {haystack}, {needles} WHERE {needle_match})'
+                match = match.format(needles=needles, haystack=haystack,
+                                     needle_match=needle_match)
+                condition = "({} = 4 AND {})".format(rank_sql, match)
 
             else:
-                data_filters.append(filter)
-        return conditions, holders, data_filters
+                # Ordering comparisons, compare ranks first.
+                holders[rank_holder] = json_rank(value)
+                sql_operator = SQL_OPERATORS.get(operator, operator.value)
+                strict_operator = sql_operator[0]
+                if value is None:
+                    condition = '{} {} :{}'.format(rank_sql, sql_operator, rank_holder)
+                else:
+                    holders[value_holder] = self._json_sql_value(value)
+                    condition = '({rank} {strict} :{rank_holder} OR ({rank} = :{rank_holder} ' \
+                                'AND {value} {operator} :{value_holder}))'
+                    condition = condition.format(rank=rank_sql, value=value_sql,
+                                                 strict=strict_operator,
+                                                 operator=sql_operator,
+                                                 rank_holder=rank_holder,
+                                                 value_holder=value_holder)
+                # Missing fields are greater than everything.
+                if operator in (COMPARISON.GT, COMPARISON.MIN):
+                    condition = '({} IS NULL OR {})'.format(rank_sql, condition)
+
+            conditions.append(condition)
+
+        return ' AND '.join(conditions), holders
+
+    # Formats the equality of a JSON field with a value.
+    def _format_json_equality(self, rank_sql, value_sql, value,
+                              value_holder, rank_holder, holders):
+        holders[rank_holder] = json_rank(value)
+        if value is None:
+            return '{} = :{}'.format(rank_sql, rank_holder)
+        holders[value_holder] = self._json_sql_value(value)
+        return '{} = :{} AND {} = :{}'.format(rank_sql, rank_holder, value_sql, value_holder)
+
+    # Converts a python value to the SQL value json_extract()
+    # would return for it.
+    def _json_sql_value(self, value):
+        if isinstance(value, bool):
+            return int(value)
+        if isinstance(value, (list, tuple, dict)):
+            return json.dumps(value, separators=(',', ':'))
+        return value
+
+    # Converts Kinto wildcards to a LIKE pattern. Wildcards
+    # are implicit at start and end if none is specified.
+    def _like_pattern(self, value):
+        value = str(value)
+        if '*' not in value:
+            value = '*{}*'.format(value)
+        return value.replace('*', '%')
 
     def flush(self, auth=None):
         pass
@@ -359,6 +572,17 @@ class Storage(StorageBase, SQLiteMigratorMixin):
 
 
 def load_from_config(config):
-    storage_location = config.get_settings()['storage_location']
-    client = SQLiteClient(storage_location)
-    return Storage(client)
\ No newline at end of file
+    settings = config.get_settings()
+    max_fetch_size = int(settings.get('storage_max_fetch_size', 50))
+    client = create_from_config(config, prefix='storage_')
+
+    # Indexes on the fields of the data blob.
+    indexed_fields = parse_indexed_fields(settings.get('storage_json_indexes'))
+    auto_index_threshold = settings.get('storage_auto_index_threshold')
+    if auto_index_threshold is not None:
+        auto_index_threshold = int(auto_index_threshold)
+    index_manager = IndexManager(client, fields=indexed_fields,
+                                 auto_index_threshold=auto_index_threshold)
+
+    return Storage(client, max_fetch_size=max_fetch_size,
+                   index_manager=index_manager)
\ No newline at end of file
@@ -0,0 +1,72 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from kinto.core.storage import exceptions
+
+from sqlite_support.client import SQLiteClient
+
+
+class SQLiteClientTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.client = SQLiteClient(os.path.join(self.tmp_dir, 'db.sqlite'),
+                                   pool_size=2,
+                                   pragmas={'cache_size': -2000})
+        with self.client.connect() as conn:
+            conn.execute("CREATE TABLE t (v INTEGER);")
+
+    def tearDown(self):
+        self.client.close()
+        shutil.rmtree(self.tmp_dir)
+
+    def test_connections_use_wal_and_configured_pragmas(self):
+        with self.client.connect(readonly=True) as conn:
+            journal_mode = conn.execute("PRAGMA journal_mode;").fetchone()[0]
+            cache_size = conn.execute("PRAGMA cache_size;").fetchone()[0]
+        self.assertEqual(journal_mode, 'wal')
+        self.assertEqual(cache_size, -2000)
+
+    def test_reader_connections_are_reused(self):
+        with self.client.connect(readonly=True) as conn:
+            first = conn.connection
+        with self.client.connect(readonly=True) as conn:
+            second = conn.connection
+        self.assertIs(first, second)
+
+    def test_readers_cannot_write(self):
+        with self.assertRaises(exceptions.BackendError):
+            with self.client.connect(readonly=True) as conn:
+                conn.execute("INSERT INTO t VALUES (1);")
+
+    def test_reads_are_not_blocked_by_pending_write(self):
+        results = []
+
+        def read():
+            with self.client.connect(readonly=True) as conn:
+                results.append(conn.execute("SELECT COUNT(*) FROM t;").fetchone()[0])
+
+        with self.client.connect() as conn:
+            conn.execute("INSERT INTO t VALUES (1);")
+            thread = threading.Thread(target=read)
+            thread.start()
+            thread.join(timeout=5)
+        self.assertEqual(results, [0])
+
+    def test_nested_reads_see_the_pending_write(self):
+        with self.client.connect() as conn:
+            conn.execute("INSERT INTO t VALUES (1);")
+            with self.client.connect(readonly=True) as nested:
+                count = nested.execute("SELECT COUNT(*) FROM t;").fetchone()[0]
+        self.assertEqual(count, 1)
+
+    def test_write_is_rolled_back_on_error(self):
+        with self.assertRaises(exceptions.BackendError):
+            with self.client.connect() as conn:
+                conn.execute("INSERT INTO t VALUES (1);")
+                conn.execute("INSERT INTO unknown VALUES (1);")
+        with self.client.connect(readonly=True) as conn:
+            count = conn.execute("SELECT COUNT(*) FROM t;").fetchone()[0]
+        self.assertEqual(count, 0)
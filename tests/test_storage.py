@@ -2,6 +2,7 @@ import unittest
 from pyramid import testing
 import storage as storage_sqlite
 
+from kinto.core.storage import exceptions
 from kinto.core.storage.testing import StorageTest
 
 class SQLiteStorageTest(StorageTest, unittest.TestCase):
@@ -21,3 +22,51 @@ class SQLiteStorageTest(StorageTest, unittest.TestCase):
         self.assertEqual(
             backend._db_path, ":memory:"
         )
+
+
+class SQLiteBulkStorageTest(unittest.TestCase):
+    def setUp(self):
+        config = testing.setUp(settings={'storage_location': ':memory:'})
+        self.storage = storage_sqlite.load_from_config(config)
+        self.storage.initialize_schema()
+        self.storage_kw = {'collection_id': 'test', 'parent_id': '1234'}
+
+    def test_create_many_returns_created_records(self):
+        records = self.storage.create_many(records=[{'a': 1}, {'id': 'b', 'a': 2}],
+                                           **self.storage_kw)
+        self.assertEqual(records[1]['id'], 'b')
+        for record in records:
+            self.assertIn('last_modified', record)
+            self.assertEqual(self.storage.get(object_id=record['id'], **self.storage_kw),
+                             record)
+
+    def test_create_many_is_atomic_on_unicity_error(self):
+        self.storage.create(record={'id': 'b'}, **self.storage_kw)
+        with self.assertRaises(exceptions.UnicityError):
+            self.storage.create_many(records=[{'id': 'a'}, {'id': 'b'}], **self.storage_kw)
+        with self.assertRaises(exceptions.RecordNotFoundError):
+            self.storage.get(object_id='a', **self.storage_kw)
+
+    def test_create_many_raises_on_duplicated_ids_in_batch(self):
+        with self.assertRaises(exceptions.UnicityError):
+            self.storage.create_many(records=[{'id': 'a'}, {'id': 'a'}], **self.storage_kw)
+
+    def test_update_many_replaces_records(self):
+        self.storage.create(record={'id': 'a', 'v': 1}, **self.storage_kw)
+        records = self.storage.update_many(records=[{'id': 'a', 'v': 2}, {'id': 'b', 'v': 3}],
+                                           **self.storage_kw)
+        self.assertEqual([r['v'] for r in records], [2, 3])
+        self.assertEqual(self.storage.get(object_id='a', **self.storage_kw)['v'], 2)
+
+    def test_delete_many_is_atomic_on_unknown_record(self):
+        self.storage.create(record={'id': 'a'}, **self.storage_kw)
+        with self.assertRaises(exceptions.RecordNotFoundError):
+            self.storage.delete_many(object_ids=['a', 'unknown'], **self.storage_kw)
+        self.storage.get(object_id='a', **self.storage_kw)
+
+    def test_delete_many_deletes_records(self):
+        self.storage.create_many(records=[{'id': 'a'}, {'id': 'b'}], **self.storage_kw)
+        deleted = self.storage.delete_many(object_ids=['a', 'b'], **self.storage_kw)
+        self.assertTrue(all(record['deleted'] for record in deleted))
+        with self.assertRaises(exceptions.RecordNotFoundError):
+            self.storage.get(object_id='b', **self.storage_kw)